@@ -1,16 +1,103 @@
-from manim import *
 import tempfile
 import os
+import ast
+import asyncio
+import hashlib
+import importlib.util
+import multiprocessing
+import multiprocessing.connection
+import re
+import stat
 import sys
 import subprocess
-import py_compile
+import threading
+import time
+import traceback
 from dotenv import load_dotenv
 from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
 
 # Load environment variables
 load_dotenv()
 
+# Temp paths and object addresses vary per run; they are masked before hashing errors
+_VOLATILE_ERROR_RE = re.compile(re.escape(tempfile.gettempdir()) + r'[^\s"\'<>]*|0x[0-9a-fA-F]+')
+
+def _init_fix_cache_dir():
+    """
+    Create the per-user on-disk cache of LLM fixes
+    
+    Cached fixes are executed as code, so the directory must be private to
+    the current user; the cache is disabled if that cannot be ensured.
+    
+    Returns:
+        str: Cache directory path, or None if the cache is disabled
+    """
+    cache_root = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    cache_dir = os.path.join(cache_root, 'edugen', 'fix_cache')
+    try:
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        dir_stat = os.lstat(cache_dir)
+        if not stat.S_ISDIR(dir_stat.st_mode):
+            raise OSError("not a directory")
+        if hasattr(os, 'getuid'):
+            if dir_stat.st_uid != os.getuid():
+                raise OSError("owned by another user")
+            if dir_stat.st_mode & 0o077:
+                os.chmod(cache_dir, 0o700)
+    except OSError as e:
+        print(f"Warning: LLM fix cache disabled ({cache_dir}: {e})")
+        return None
+    return cache_dir
+
+# On-disk cache of LLM fixes that passed a trial render, keyed by (failed code, error)
+_FIX_CACHE_DIR = _init_fix_cache_dir()
+
+def _fix_cache_path(manim_code, error_message):
+    """Return the cache file path for a given code and error message, or None if caching is disabled"""
+    if _FIX_CACHE_DIR is None:
+        return None
+    normalized_error = _VOLATILE_ERROR_RE.sub('<masked>', error_message or '')
+    code_hash = hashlib.sha256(manim_code.encode()).hexdigest()
+    error_hash = hashlib.sha256(normalized_error[:500].encode()).hexdigest()
+    key = hashlib.sha256(f"{code_hash}|{error_hash}".encode()).hexdigest()
+    return os.path.join(_FIX_CACHE_DIR, f"{key}.py")
+
+def _read_fix_cache(cache_path):
+    """Read a cached fix, returning None on a miss or unreadable entry"""
+    if cache_path is None:
+        return None
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except OSError:
+        return None
+
+def _write_fix_cache(cache_path, content):
+    """Atomically write a fix to the cache, ignoring failures"""
+    if cache_path is None:
+        return
+    temp_path = None
+    try:
+        # Write beside the entry and rename, so readers never see a partial file
+        fd, temp_path = tempfile.mkstemp(dir=_FIX_CACHE_DIR, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        print(f"Warning: Failed to write LLM fix cache {cache_path}: {e}")
+        if temp_path and os.path.exists(temp_path):
+            os.unlink(temp_path)
+
+def _evict_fix_cache(cache_path):
+    """Remove a cached fix that failed when replayed"""
+    try:
+        os.unlink(cache_path)
+    except OSError:
+        pass
+
+# Serializes in-process use of Manim's process-global config (see trial_render_manim)
+_MANIM_CONFIG_LOCK = threading.Lock()
+
 # LLM client using LangChain with Google Generative AI
 class LLMClient:
     def __init__(self):
@@ -20,6 +107,9 @@ class LLMClient:
             if not google_api_key:
                 raise ValueError("GOOGLE_API_KEY not found in environment variables")
             
+            # Imported only once an API key is present; the import is slow
+            from langchain_google_genai import ChatGoogleGenerativeAI
+            
             # Initialize the Google Generative AI model
             self.llm = ChatGoogleGenerativeAI(
                 google_api_key=google_api_key,
@@ -35,25 +125,34 @@ class LLMClient:
             print("Falling back to basic error handling")
             self.llm = None
     
-    def fix_manim_code(self, manim_code, error_message=None):
+    async def warmup(self):
         """
-        Direct fix of Manim code using LLM
+        Send a tiny request over the async transport, discarding the result
+        
+        The first LLM call in the fix loop is the async speculative fix, so
+        priming this channel lets it skip the connection handshake.
+        """
+        if self.llm is None:
+            return
+        try:
+            await self.llm.ainvoke([HumanMessage(content="ok")])
+        except Exception as e:
+            print(f"Warning: LLM warmup request failed: {e}")
+    
+    def _build_fix_messages(self, manim_code, error_message=None):
+        """
+        Build the chat messages for a fix request
         
         Args:
             manim_code (str): The Manim code to fix
             error_message (str, optional): Specific error message if available
             
         Returns:
-            str: Fixed Manim code
+            list: System and human messages for the LLM
         """
-        if self.llm is None:
-            print("LLM not available, returning original code")
-            return manim_code
-        
-        try:
-            # Create prompt for fixing the code
-            if error_message:
-                prompt = f"""Fix this Manim Python code that has the following error:
+        # Create prompt for fixing the code
+        if error_message:
+            prompt = f"""Fix this Manim Python code that has the following error:
 
 ERROR: {error_message}
 
@@ -61,38 +160,160 @@ MANIM CODE TO FIX:
 {manim_code}
 
 Return only the corrected Python code with proper Manim syntax."""
-            else:
-                prompt = f"""Review and fix this Manim Python code to ensure it compiles and runs correctly:
+        else:
+            prompt = f"""Review and fix this Manim Python code to ensure it compiles and runs correctly:
 
 MANIM CODE:
 {manim_code}
 
 Return only the corrected Python code with proper Manim syntax."""
+        
+        return [
+            SystemMessage(content="You are an expert Manim code fixer. Return only corrected Python code, no explanations or markdown."),
+            HumanMessage(content=prompt)
+        ]
+    
+    @staticmethod
+    def _cut_at_closing_fence(text):
+        """
+        Cut a response at the end of its markdown code block
+        
+        Args:
+            text (str): LLM response text, possibly still streaming
             
-            # Direct LLM call
-            messages = [
-                SystemMessage(content="You are an expert Manim code fixer. Return only corrected Python code, no explanations or markdown."),
-                HumanMessage(content=prompt)
-            ]
+        Returns:
+            str: Text up to and including the closing fence, or None if the
+                 response does not open with a code block that has been closed
+        """
+        text = text.lstrip()
+        if not text.startswith("```"):
+            return None
+        first_newline = text.find("\n")
+        if first_newline == -1:
+            return None
+        # Only a fence at the start of a line closes the block; ``` inside
+        # string literals (e.g. Text("use ```code```")) must not cut the code
+        closing_fence = text.find("\n```", first_newline)
+        if closing_fence == -1:
+            return None
+        return text[:closing_fence + 4]
+    
+    @classmethod
+    def _clean_code(cls, fixed_code):
+        """Strip surrounding whitespace, markdown code fences and any trailing prose from an LLM response"""
+        fixed_code = cls._cut_at_closing_fence(fixed_code) or fixed_code
+        
+        # Clean up any markdown formatting
+        return fixed_code.strip().removeprefix("```python").removeprefix("```").removesuffix("```").strip()
+    
+    def fix_manim_code(self, manim_code, error_message=None):
+        """
+        Direct fix of Manim code using LLM
+        
+        Args:
+            manim_code (str): The Manim code to fix
+            error_message (str, optional): Specific error message if available
             
+        Returns:
+            str: Fixed Manim code
+        """
+        if self.llm is None:
+            print("LLM not available, returning original code")
+            return manim_code
+        
+        try:
+            # Direct LLM call
+            messages = self._build_fix_messages(manim_code, error_message)
             response = self.llm.invoke(messages)
-            fixed_code = response.content.strip()
+            return self._clean_code(response.content)
             
-            # Clean up any markdown formatting
-            if fixed_code.startswith("```python"):
-                fixed_code = fixed_code[9:]
-            if fixed_code.startswith("```"):
-                fixed_code = fixed_code[3:]
-            if fixed_code.endswith("```"):
-                fixed_code = fixed_code[:-3]
+        except Exception as e:
+            print(f"Error fixing code with LLM: {e}")
+            return manim_code
+    
+    async def afix_manim_code(self, manim_code, error_message=None):
+        """
+        Async variant of fix_manim_code, used to request a fix while a trial render runs
+        
+        Args:
+            manim_code (str): The Manim code to fix
+            error_message (str, optional): Specific error message if available
             
-            return fixed_code.strip()
+        Returns:
+            str: Fixed Manim code
+        """
+        if self.llm is None:
+            return manim_code
+        
+        try:
+            # Stream the LLM response and stop as soon as the code block is closed;
+            # _clean_code drops whatever arrived after the closing fence
+            messages = self._build_fix_messages(manim_code, error_message)
+            chunks = []
+            async for chunk in self.llm.astream(messages):
+                chunks.append(chunk.content)
+                if "`" in chunk.content and self._cut_at_closing_fence("".join(chunks)):
+                    break
+            return self._clean_code("".join(chunks))
             
         except Exception as e:
             print(f"Error fixing code with LLM: {e}")
             return manim_code
+    
+    def fix_manim_code_candidates(self, manim_code, error_message=None, n=3):
+        """
+        Sample several candidate fixes of Manim code in a single LLM call
+        
+        Args:
+            manim_code (str): The Manim code to fix
+            error_message (str, optional): Specific error message if available
+            n (int): Number of candidates to request
+            
+        Returns:
+            list: Distinct candidate fixes, in the order returned by the LLM
+        """
+        if self.llm is None:
+            print("LLM not available, returning original code")
+            return [manim_code]
+        
+        try:
+            messages = self._build_fix_messages(manim_code, error_message)
+            response = self.llm.generate([messages], generation_config={"candidate_count": n})
+            
+            candidates = []
+            for generation in response.generations[0]:
+                fixed_code = self._clean_code(generation.message.content)
+                if fixed_code and fixed_code not in candidates:
+                    candidates.append(fixed_code)
+            
+            return candidates or [manim_code]
+            
+        except Exception as e:
+            print(f"Error fixing code with LLM: {e}")
+            return [manim_code]
 
-llm_client = LLMClient()
+_llm_client = None
+_llm_client_lock = threading.Lock()
+
+def get_llm_client():
+    """
+    Return the shared LLM client, creating it on first use
+    
+    Built lazily so importing this module (and every trial render worker
+    process, which imports it too) never pays for the LLM client setup.
+    
+    Returns:
+        LLMClient: The shared client
+    """
+    global _llm_client
+    with _llm_client_lock:
+        if _llm_client is None:
+            _llm_client = LLMClient()
+        return _llm_client
+
+def _code_snapshot(code, limit=500):
+    """Return the code for an error log entry, truncated to limit characters"""
+    return code if len(code) <= limit else f"{code[:limit]}..."
 
 def validate_and_fix_manim_code(manim_code, max_attempts=5):
     """
@@ -111,40 +332,27 @@ def validate_and_fix_manim_code(manim_code, max_attempts=5):
     error_history = []
     
     while attempt < max_attempts:
-        # Create temporary Python file for validation
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as temp_file:
-            temp_file.write(current_code)
-            temp_file_path = temp_file.name
-        
         try:
-            # Attempt compilation
-            py_compile.compile(temp_file_path, doraise=True)
-            
-            # If successful, clean up and return
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
+            # Attempt in-memory compilation (no temp file or .pyc needed)
+            compile(current_code, '<manim-scene>', 'exec')
             return current_code, True, error_history
             
-        except py_compile.PyCompileError as e:
+        except SyntaxError as e:
             # Capture compilation error
+            error_message = f"{e.msg} at line {e.lineno}"
             error_info = {
                 'attempt': attempt + 1,
-                'error': str(e),
-                'code_snapshot': current_code[:500] + "..." if len(current_code) > 500 else current_code
+                'error': error_message,
+                'code_snapshot': _code_snapshot(current_code)
             }
             error_history.append(error_info)
             
-            print(f"Attempt {attempt + 1} failed compilation: {e}")
+            print(f"Attempt {attempt + 1} failed compilation: {error_message}")
             
             # Send to LLM for fixing
             print("Attempting to fix code with LLM...")
-            current_code = llm_client.fix_manim_code(current_code, str(e))
+            current_code = get_llm_client().fix_manim_code(current_code, error_message)
             attempt += 1
-            
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
     
     # If all attempts failed
     print(f"Failed to validate and fix code after {max_attempts} attempts.")
@@ -154,6 +362,16 @@ def trial_render_manim(temp_file_path, scene_class_name, output_dir="trial_media
     """
     Perform a trial render of Manim code to check for rendering errors
     
+    The scene is rendered in-process through the Manim Scene API as a dry run,
+    so construct() is executed end-to-end without spawning a manim subprocess
+    or encoding a video.
+    
+    create_animation_from_code calls this inside a trial render worker process
+    (see _run_trial_renders), so generated code never runs in the server
+    process and a hung or crashing scene can be killed. Manim's config is
+    process-global, so direct in-process callers are serialized with
+    _MANIM_CONFIG_LOCK.
+    
     Args:
         temp_file_path (str): Path to temporary Python file with Manim code
         scene_class_name (str): Name of the scene class to render
@@ -163,37 +381,47 @@ def trial_render_manim(temp_file_path, scene_class_name, output_dir="trial_media
         tuple: (success_status, error_message)
     """
     try:
+        from manim import tempconfig
+        
         # Ensure trial output directory exists
         os.makedirs(output_dir, exist_ok=True)
         
-        # Trial render command with low quality for speed
-        cmd = [
-            'manim', 
-            temp_file_path,
-            scene_class_name,
-            '-ql',  # low quality for trial
-            '--disable_caching',
-            f'--media_dir={output_dir}'
-        ]
+        # Trial render settings: low quality, no caching, no movie output
+        trial_config = {
+            'quality': 'low_quality',
+            'disable_caching': True,
+            'media_dir': output_dir,
+            'write_to_movie': False,
+            'dry_run': True,
+        }
         
-        print(f"Running trial render: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=True, check=False)
+        print(f"Running in-process trial render of {scene_class_name} from {temp_file_path}")
+        spec = importlib.util.spec_from_file_location('edugen_trial_scene', temp_file_path)
+        module = importlib.util.module_from_spec(spec)
         
-        if result.returncode == 0:
-            print("Trial render successful!")
-            # Clean up trial animations after successful render
-            cleanup_trial_animations(output_dir)
-            return True, None
-        else:
-            error_message = f"Trial render failed:\nReturn Code: {result.returncode}\nStdout: {result.stdout}\nStderr: {result.stderr}"
-            print(f"Trial render failed: {error_message}")
-            return False, error_message
+        with _MANIM_CONFIG_LOCK, tempconfig(trial_config):
+            spec.loader.exec_module(module)
+            scene_class = getattr(module, scene_class_name)
+            scene_class().render()
+        
+        print("Trial render successful!")
+        return True, None
             
-    except Exception as e:
-        error_message = f"Trial render exception: {str(e)}"
+    except (Exception, SystemExit):
+        error_message = f"Trial render failed:\n{traceback.format_exc()}"
         print(error_message)
         return False, error_message
 
+def _fast_rmtree(path):
+    """Remove a small directory tree with os.scandir, without shutil's per-entry overhead"""
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                _fast_rmtree(entry.path)
+            else:
+                os.unlink(entry.path)
+    os.rmdir(path)
+
 def cleanup_trial_animations(trial_output_dir):
     """
     Clean up trial animation files and directories after successful trial render
@@ -203,86 +431,505 @@ def cleanup_trial_animations(trial_output_dir):
     """
     try:
         if os.path.exists(trial_output_dir):
-            import shutil
-            shutil.rmtree(trial_output_dir)
+            _fast_rmtree(trial_output_dir)
             print(f"✓ Cleaned up trial animations from: {trial_output_dir}")
     except Exception as e:
         print(f"Warning: Failed to clean up trial animations from {trial_output_dir}: {e}")
 
-def create_animation_from_code(manim_code, output_dir="media/videos", max_render_attempts=3):
+def _import_validate(code_object):
     """
-    Enhanced animation creator with pre-validation and trial rendering.
-    Create animation from generated Manim code.
+    Execute compiled Manim code in a fresh namespace without rendering
+    
+    Catches ImportError, NameError and class-body errors at the module
+    level before a trial render is attempted. Runs under tempconfig so
+    module-level config changes (e.g. config.background_color) are rolled
+    back instead of leaking into Manim's global config.
     
     Args:
-        manim_code (str): Complete Manim Python code
-        output_dir (str): Directory to save the rendered video
-        max_render_attempts (int): Maximum attempts for render fixes
+        code_object (code): Compiled module code
         
     Returns:
-        str: Path to the generated video file, or None if failed
+        dict: The module namespace after execution
     """
-    if not manim_code:
-        print("No Manim code provided")
-        return None
+    from manim import tempconfig
+    
+    namespace = {'__name__': 'edugen_trial_scene'}
+    with _MANIM_CONFIG_LOCK, tempconfig({}):
+        exec(code_object, namespace)
+    return namespace
 
-    # Pre-validate the code
-    validated_code, is_valid, error_log = validate_and_fix_manim_code(manim_code)
+def _format_scene_error(error, manim_code):
+    """
+    Format an exception raised by generated code, keeping only its own frames
     
-    if not is_valid:
-        print("Failed to generate valid Manim code after maximum attempts.")
-        print("Error history:")
-        for err_info in error_log:
-            print(f"  Attempt {err_info['attempt']}: {err_info['error']}")
-        return None
+    Args:
+        error (Exception): Exception raised while executing the code
+        manim_code (str): Source of the executed code, used to show the failing lines
+        
+    Returns:
+        str: Traceback limited to <manim-scene> frames, followed by the exception
+    """
+    source_lines = manim_code.splitlines()
+    lines = ["Traceback (most recent call last):\n"]
+    for frame in traceback.extract_tb(error.__traceback__):
+        if frame.filename != '<manim-scene>':
+            continue
+        lines.append(f'  File "<manim-scene>", line {frame.lineno}, in {frame.name}\n')
+        if frame.lineno and frame.lineno <= len(source_lines):
+            lines.append(f"    {source_lines[frame.lineno - 1].strip()}\n")
+    lines.extend(traceback.format_exception_only(type(error), error))
+    return "".join(lines)
+
+def _check_code(manim_code):
+    """
+    Run the cheap local checks that precede a trial render
+    
+    Parses and compiles the code once and finds the scene class on the shared
+    tree. Executing the module (import and class-definition errors) happens
+    in the trial render worker, never in the server process.
     
-    # Extract scene class name from validated code
-    scene_class_name = extract_scene_class_name(validated_code)
+    Args:
+        manim_code (str): Manim code to check
+        
+    Returns:
+        tuple: (scene_class_name, error_message) - error_message is None if all checks pass
+    """
+    try:
+        tree = ast.parse(manim_code, '<manim-scene>')
+        compile(tree, '<manim-scene>', 'exec')
+    except SyntaxError as e:
+        return None, f"{e.msg} at line {e.lineno}"
+    
+    scene_class_name = extract_scene_class_name(manim_code, tree)
     if not scene_class_name:
-        print("Could not find scene class in the validated code.")
-        return None
+        return None, "Could not find a Scene subclass in the code"
     
-    # Trial rendering loop
-    render_attempt = 0
-    current_code = validated_code
+    return scene_class_name, None
+
+def _trial_render_worker(candidate_code, scene_class_name, work_dir):
+    """
+    Trial render one candidate in its own working directory (worker process entry point)
+    
+    Executes the module first so import and class-definition errors are
+    reported as such, then runs the dry-run render. The caller owns work_dir
+    and removes it, since workers may be killed before they can clean up.
     
-    while render_attempt < max_render_attempts:
-        # Create temporary file with current code
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as temp_file:
-            temp_file.write(current_code)
-            temp_file_path = temp_file.name
+    Args:
+        candidate_code (str): Candidate Manim code
+        scene_class_name (str): Name of the scene class to render
+        work_dir (str): Directory for this candidate's scene file and trial output
         
+    Returns:
+        tuple: (success_status, error_message)
+    """
+    scene_file_path = os.path.join(work_dir, 'scene.py')
+    with open(scene_file_path, 'w', encoding='utf-8') as f:
+        f.write(candidate_code)
+    
+    # Cheap import/class-definition check before spending a render
+    try:
+        _import_validate(compile(candidate_code, '<manim-scene>', 'exec'))
+    except (Exception, SystemExit) as e:
+        return False, f"Import or class definition failed:\n{_format_scene_error(e, candidate_code)}"
+    
+    return trial_render_manim(scene_file_path, scene_class_name, os.path.join(work_dir, 'media'))
+
+# Upper bound on a single trial render; a scene still running after this is killed
+_TRIAL_RENDER_TIMEOUT = 120
+
+def _trial_worker_main(conn):
+    """Serve trial render jobs from the pipe until it is closed (worker process main loop)"""
+    try:
+        # Pay Manim's import cost up front, before the first job arrives
+        import manim  # noqa: F401
+    except ImportError:
+        pass
+    
+    while True:
         try:
-            # Perform trial render
-            trial_success, trial_error = trial_render_manim(temp_file_path, scene_class_name)
-            
-            if trial_success:
-                print("Trial render successful! Proceeding with final render...")
+            job = conn.recv()
+        except EOFError:
+            return
+        conn.send(_trial_render_worker(*job))
+
+class _TrialRenderWorker:
+    """Reusable child process that runs trial renders away from the server process"""
+    
+    def __init__(self):
+        # spawn rather than fork: the server has event-loop and LLM transport threads running
+        context = multiprocessing.get_context('spawn')
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_trial_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+    
+    def kill(self):
+        """Kill the worker process and release its pipe"""
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+_idle_workers = []
+_workers_lock = threading.Lock()
+
+def _acquire_worker():
+    """Take an idle live worker, or start a new one"""
+    with _workers_lock:
+        while _idle_workers:
+            worker = _idle_workers.pop()
+            if worker.process.is_alive():
+                return worker
+            worker.kill()
+    return _TrialRenderWorker()
+
+def _release_worker(worker):
+    """Return a worker that finished its job to the idle set for reuse"""
+    with _workers_lock:
+        _idle_workers.append(worker)
+
+def _prestart_trial_worker():
+    """Start a worker ahead of the first trial render if none is idle"""
+    with _workers_lock:
+        if _idle_workers:
+            return
+    _release_worker(_TrialRenderWorker())
+
+def _run_trial_renders(jobs, timeout=_TRIAL_RENDER_TIMEOUT):
+    """
+    Run trial render jobs on worker processes, stopping at the first success
+    
+    Workers that finish are kept for reuse. Workers still running when a job
+    succeeds or the deadline passes, and workers that die mid-job (segfault,
+    OOM kill, os._exit), are killed and replaced on demand.
+    
+    Args:
+        jobs (list): (candidate_code, scene_class_name, work_dir) tuples
+        timeout (float): Deadline in seconds for the whole batch
+        
+    Returns:
+        tuple: (winning_index, results) - winning_index is None if no job
+               succeeded; results maps job index to (success_status, error_message)
+    """
+    running = {}
+    results = {}
+    try:
+        for index, job in enumerate(jobs):
+            worker = _acquire_worker()
+            running[index] = worker
+            worker.conn.send(job)
+        
+        deadline = time.monotonic() + timeout
+        while running:
+            remaining = deadline - time.monotonic()
+            # A dead worker closes its pipe end, which also makes it ready
+            ready = multiprocessing.connection.wait(
+                [worker.conn for worker in running.values()], timeout=max(remaining, 0)
+            )
+            if not ready:
+                for index in running:
+                    results[index] = (False, f"Trial render timed out after {timeout} seconds (construct() may never return)")
                 break
-            else:
-                print(f"Trial render attempt {render_attempt + 1} failed.")
+            
+            for index, worker in list(running.items()):
+                if worker.conn not in ready:
+                    continue
+                del running[index]
+                try:
+                    results[index] = worker.conn.recv()
+                    _release_worker(worker)
+                except (EOFError, OSError):
+                    worker.kill()
+                    results[index] = (False, f"Trial render worker crashed (exit code {worker.process.exitcode})")
                 
-                if render_attempt < max_render_attempts - 1:
-                    print("Attempting to fix rendering errors with LLM...")
-                    # Send to LLM for fixing rendering issues
-                    current_code = llm_client.fix_manim_code(current_code, trial_error)
-                    render_attempt += 1
+                if results[index][0]:
+                    return index, results
+        return None, results
+    finally:
+        # Stop renders that are no longer needed or ran past the deadline
+        for worker in running.values():
+            worker.kill()
+
+def _trial_render_candidates(renderable):
+    """
+    Trial render (code, scene_class_name) pairs on workers, each in its own work directory
+    
+    Args:
+        renderable (list): (candidate_code, scene_class_name) tuples
+        
+    Returns:
+        tuple: (winning_index, results) as returned by _run_trial_renders
+    """
+    work_dirs = [tempfile.mkdtemp(prefix='edugen_trial_') for _ in renderable]
+    try:
+        return _run_trial_renders([
+            (candidate, scene_class_name, work_dir)
+            for (candidate, scene_class_name), work_dir in zip(renderable, work_dirs)
+        ])
+    finally:
+        for work_dir in work_dirs:
+            cleanup_trial_animations(work_dir)
+
+def _race_candidates(candidates):
+    """
+    Check candidate fixes locally, then trial render the survivors in parallel
+    
+    Rendering is CPU-bound, so the candidates that survive the local checks
+    are spread across trial render worker processes and the first one to
+    render successfully wins; workers still rendering losers are killed.
+    
+    Args:
+        candidates (list): Candidate Manim code strings
+        
+    Returns:
+        tuple: (winning_code, scene_class_name, None) on success, or
+               (failed_code, None, error_message) for the best failed candidate
+    """
+    failures = []
+    renderable = []
+    for candidate in candidates:
+        scene_class_name, error_message = _check_code(candidate)
+        if error_message is None:
+            renderable.append((candidate, scene_class_name))
+        else:
+            failures.append((candidate, error_message))
+    
+    if not renderable:
+        return failures[0][0], None, failures[0][1]
+    
+    if len(renderable) > 1:
+        print(f"Trial rendering {len(renderable)} candidate fix(es) in parallel...")
+    winning_index, results = _trial_render_candidates(renderable)
+    
+    if winning_index is not None:
+        candidate, scene_class_name = renderable[winning_index]
+        return candidate, scene_class_name, None
+    
+    # Render failures carry more information than static-check failures
+    first_failure = min(results)
+    return renderable[first_failure][0], None, results[first_failure][1]
+
+async def _fix_loop(manim_code, temp_file, temp_file_path, max_attempts=8):
+    """
+    Single validate + trial-render loop with LLM fixes.
+    
+    Each attempt runs the cheap local checks first (compile, scene lookup)
+    and only sends the code to a trial render worker process when they pass. Any failure
+    is sent to the LLM in one call that samples several candidate fixes;
+    the candidates are checked locally and trial rendered in parallel, and
+    the first that renders wins.
+    
+    Only fixes that pass a trial render are cached, keyed by the code they
+    fixed and its error; a cached fix is replayed before asking the LLM and
+    evicted if it fails again.
+    
+    While a trial render runs in a worker process, a speculative LLM review of
+    the same code is requested concurrently. It is cancelled if the render
+    succeeds and used as the next attempt if it fails. Speculative and
+    error-informed fixes alternate so render errors still reach the LLM.
+    
+    Args:
+        manim_code (str): Manim code to validate and trial render
+        temp_file (file): Open temporary .py file, rewritten in place for each attempt
+        temp_file_path (str): Path of temp_file, used by the final render
+        max_attempts (int): Maximum number of attempts across both stages
+        
+    Returns:
+        tuple: (fixed_code, scene_class_name, success_status, error_log)
+    """
+    attempt = 0
+    current_code = manim_code
+    error_history = []
+    known_error = None
+    speculative_fix = None
+    from_speculative_fix = False
+    fix_cache_path = None
+    fix_from_cache = False
+    
+    def remember_fix(code):
+        # current_code passed its trial render; cache it for the code it fixed
+        if fix_cache_path and not fix_from_cache:
+            _write_fix_cache(fix_cache_path, code)
+    
+    def write_temp_file(code):
+        # Rewrite the reused temp file with the given code
+        temp_file.seek(0)
+        temp_file.truncate()
+        temp_file.write(code)
+        temp_file.flush()
+    
+    try:
+        while attempt < max_attempts:
+            attempt += 1
+            speculative_fix = None
+            
+            if known_error is not None:
+                # Already checked and rendered by the candidate race
+                error_message, known_error = known_error, None
+            else:
+                # Local checks, then trial render
+                scene_class_name, error_message = _check_code(current_code)
+                if error_message is not None:
+                    print(f"Attempt {attempt} failed: {error_message}")
                 else:
-                    print(f"Failed to fix rendering errors after {max_render_attempts} attempts.")
-                    return None
+                    # Trial render, with a speculative LLM fix in flight meanwhile
+                    if not from_speculative_fix and attempt < max_attempts:
+                        speculative_fix = asyncio.create_task(get_llm_client().afix_manim_code(current_code))
                     
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
+                    _, results = await asyncio.to_thread(
+                        _trial_render_candidates, [(current_code, scene_class_name)]
+                    )
+                    trial_success, error_message = results[0]
+                    if trial_success:
+                        write_temp_file(current_code)
+                        remember_fix(current_code)
+                        return current_code, scene_class_name, True, error_history
+                    print(f"Trial render attempt {attempt} failed.")
+            
+            error_history.append({
+                'attempt': attempt,
+                'error': error_message,
+                'code_snapshot': _code_snapshot(current_code)
+            })
+            
+            if attempt >= max_attempts:
+                break
+            
+            # A cached fix that failed again is stale
+            if fix_from_cache:
+                _evict_fix_cache(fix_cache_path)
+            
+            fix_cache_path = _fix_cache_path(current_code, error_message)
+            cached_fix = _read_fix_cache(fix_cache_path)
+            fix_from_cache = bool(cached_fix) and cached_fix != current_code
+            if fix_from_cache:
+                print("Using cached LLM fix")
+                if speculative_fix:
+                    speculative_fix.cancel()
+                    speculative_fix = None
+                current_code = cached_fix
+                from_speculative_fix = False
+                continue
+            
+            # Without an LLM every "fix" is the same code; re-rendering it can't help
+            if get_llm_client().llm is None:
+                print("LLM not available, stopping fix attempts.")
+                break
+            
+            speculative_code = await speculative_fix if speculative_fix else None
+            speculative_fix = None
+            from_speculative_fix = bool(speculative_code) and speculative_code != current_code
+            
+            if from_speculative_fix:
+                print("Using LLM fix prepared during the trial render...")
+                current_code = speculative_code
+                continue
+            
+            print("Attempting to fix code with LLM...")
+            candidates = await asyncio.to_thread(get_llm_client().fix_manim_code_candidates, current_code, error_message)
+            current_code, scene_class_name, known_error = await asyncio.to_thread(_race_candidates, candidates)
+            
+            if known_error is None:
+                write_temp_file(current_code)
+                remember_fix(current_code)
+                print("Candidate trial render successful!")
+                return current_code, scene_class_name, True, error_history
+    finally:
+        if speculative_fix:
+            speculative_fix.cancel()
+    
+    print(f"Failed to validate and render code after {attempt} attempts.")
+    return current_code, None, False, error_history
+
+_event_loop = None
+_event_loop_lock = threading.Lock()
+
+def _get_event_loop():
+    """
+    Return the long-lived event loop that runs the fix loop, starting it on first use
+    
+    The async LLM transport is bound to the loop it was first used on, so
+    every create_animation_from_code call must share one loop rather than
+    creating a new one with asyncio.run.
+    
+    Returns:
+        asyncio.AbstractEventLoop: Loop running forever in a daemon thread
+    """
+    global _event_loop
+    with _event_loop_lock:
+        if _event_loop is None:
+            _event_loop = asyncio.new_event_loop()
+            threading.Thread(target=_event_loop.run_forever, name='edugen-event-loop', daemon=True).start()
+        return _event_loop
+
+_warmup_started = False
+
+def _start_llm_warmup():
+    """Start the LLM warmup on the shared event loop, once per process, without waiting for it"""
+    global _warmup_started
+    with _event_loop_lock:
+        if _warmup_started:
+            return
+        _warmup_started = True
+    asyncio.run_coroutine_threadsafe(get_llm_client().warmup(), _get_event_loop())
+
+def _open_scene_file():
+    """
+    Create the temporary .py scene file shared by the fix loop and final render
+    
+    Manim imports scenes by file path and needs a real .py name, so an
+    anonymous O_TMPFILE handle (/proc/self/fd/N) cannot be used here.
+    
+    Returns:
+        tuple: (open file object, file path)
+    """
+    fd, path = tempfile.mkstemp(suffix='.py')
+    return os.fdopen(fd, 'w+', encoding='utf-8'), path
+
+def create_animation_from_code(manim_code, output_dir="media/videos", max_fix_attempts=8):
+    """
+    Enhanced animation creator with pre-validation and trial rendering.
+    Create animation from generated Manim code.
     
-    # If we reach here, trial render was successful
-    # Proceed with final rendering using validated and render-tested code
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as temp_file:
-        temp_file.write(current_code)
-        temp_file_path = temp_file.name
+    Args:
+        manim_code (str): Complete Manim Python code
+        output_dir (str): Directory to save the rendered video
+        max_fix_attempts (int): Maximum validate/trial-render attempts with LLM fixes
+        
+    Returns:
+        str: Path to the generated video file, or None if failed
+    """
+    if not manim_code:
+        print("No Manim code provided")
+        return None
+    
+    # Prime the LLM connection and a trial render worker while the first attempt is checked
+    _start_llm_warmup()
+    _prestart_trial_worker()
+
+    # One temporary file shared by every trial attempt and the final render
+    temp_file, temp_file_path = _open_scene_file()
+    current_code = manim_code
     
     try:
+        # Validate and trial render in a single fix loop
+        current_code, scene_class_name, is_valid, error_log = asyncio.run_coroutine_threadsafe(
+            _fix_loop(manim_code, temp_file, temp_file_path, max_fix_attempts), _get_event_loop()
+        ).result()
+        
+        if not is_valid:
+            print("Failed to generate renderable Manim code after maximum attempts.")
+            print("Error history:")
+            for err_info in error_log:
+                print(f"  Attempt {err_info['attempt']}: {err_info['error']}")
+            return None
+        
+        print("Trial render successful! Proceeding with final render...")
+        temp_file.close()
+        
+        # If we reach here, trial render was successful
+        # Proceed with final rendering using validated and render-tested code,
+        # which is already written to the temporary file
+        
         # Ensure output directory exists
         os.makedirs(output_dir, exist_ok=True)
 
@@ -293,12 +940,15 @@ def create_animation_from_code(manim_code, output_dir="media/videos", max_render
             scene_class_name,
             '-qm',  # medium quality for final render
             '--disable_caching',
+            '--progress_bar', 'none',  # progress bars go to stderr and dominate its volume
             f'--media_dir={output_dir}' 
         ]
-        
+    
         print(f"Running final render: {' '.join(cmd)}")
+        # With progress bars off, both streams are small; stdout carries Manim's
+        # logger output (e.g. LaTeX errors), which the failure branch reports
         result = subprocess.run(cmd, capture_output=True, text=True, check=False)
-        
+    
         if result.returncode == 0:
             # Find the generated video
             video_path = find_generated_video(output_dir, scene_class_name, os.path.basename(temp_file_path).replace('.py',''))
@@ -315,7 +965,7 @@ def create_animation_from_code(manim_code, output_dir="media/videos", max_render
             print(f"Return Code: {result.returncode}")
             print(f"Stdout: {result.stdout}")
             print(f"Stderr: {result.stderr}")
-            
+        
             # Log the code that failed final rendering
             print("\n" + "="*60)
             print("🚨 FINAL MANIM RENDERING FAILED AFTER SUCCESSFUL TRIAL")
@@ -328,7 +978,7 @@ def create_animation_from_code(manim_code, output_dir="media/videos", max_render
             print("─" * 40)
             print("="*60)
             return None
-            
+        
     except Exception as e:
         print(f"An unexpected error occurred during final animation creation: {e}")
         print("Code at time of exception:")
@@ -336,31 +986,52 @@ def create_animation_from_code(manim_code, output_dir="media/videos", max_render
         return None
     finally:
         # Clean up temporary file
+        temp_file.close()
         if os.path.exists(temp_file_path):
             try:
                 os.unlink(temp_file_path)
             except OSError as e:
                 print(f"Error deleting temporary file {temp_file_path}: {e}")
 
-def extract_scene_class_name(manim_code):
+def extract_scene_class_name(manim_code, tree=None):
     """
     Extract the Scene class name from Manim code.
     
     Args:
         manim_code (str): Manim Python code
+        tree (ast.Module, optional): Already parsed tree of manim_code, to avoid parsing twice
         
     Returns:
         str: Scene class name or None if not found
     """
-    import re
-    # Improved regex to handle various Scene inheritances like class MyScene(Scene): or class MyScene(MovingCameraScene):
-    match = re.search(r'class\s+(\w+)\s*\(\s*(?:\w*?Scene\w*?)\s*\)', manim_code)
-    return match.group(1) if match else None
+    if tree is None:
+        try:
+            tree = ast.parse(manim_code)
+        except SyntaxError:
+            return None
+    
+    # Handles any Scene inheritance like class MyScene(Scene): or class MyScene(manim.MovingCameraScene):
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.ClassDef):
+            continue
+        for base in node.bases:
+            base_name = base.id if isinstance(base, ast.Name) else getattr(base, 'attr', '')
+            if base_name.endswith('Scene'):
+                return node.name
+    return None
 
 def find_generated_video(base_dir, scene_class_name, temp_file_name_stem=None):
     """
     Find the generated video file in Manim's output structure
     """
+    if temp_file_name_stem:
+        # Manim writes to <media_dir>/videos/<file_stem>/<quality>/<scene_name>.mp4,
+        # so check the expected paths directly before scanning the tree
+        for quality in ('720p30', '480p15', '1080p60', '1440p60', '2160p60'):
+            expected_path = os.path.join(base_dir, 'videos', temp_file_name_stem, quality, f"{scene_class_name}.mp4")
+            if os.path.isfile(expected_path):
+                return expected_path
+    
     possible_paths_to_check = []
     if temp_file_name_stem:
         # Path structure: <media_dir>/<temp_file_name_stem>/<quality_subdir>/<scene_name>.mp4
@@ -391,6 +1062,8 @@ def create_animation(script):
     Args:
         script (str): Text script to display
     """
+    from manim import Scene, Text, Write
+    
     class MyScene(Scene):
         def construct(self):
             text = Text(script[:100] + "..." if len(script) > 100 else script)